@@ -1,24 +1,78 @@
 # app.py (final with bigger highlighted NLQ box + suggestion buttons)
 from __future__ import annotations
+import copy
+from dataclasses import astuple
+import json
+import re
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
 import streamlit as st
 
 from constants import APP_TITLE, EXPECTED_COLS
 from data_io import load_sample, load_uploaded, validate_columns
 from features import derive_features
 from filters import sidebar_filters, apply_filters
-from kpis import compute_kpis, render_kpis
+from kpis import render_kpis
 from charts import render_charts
+from dashboard import compute_dashboard
 from tables import risky_shipments_table, download_filtered, data_dictionary_expander
 from nlq import apply_prompt_filters
 
 from app_secrets import get_secret
-from llm_router import llm_plan_via_hf_router
+from llm_router import llm_plan_first_of
 from planner import apply_llm_plan, sanitize_plan
-from ui import header, data_source_picker, footer_description
+from ui import header, data_source_picker, footer_description, reuse_across_reruns
 
 # enrichment helper
 from nlq_hf import extract_top_limit_from_text
 
+# Enrichment keywords, tagged in a single pass over the prompt (substring semantics, like `in`)
+_KW = re.compile(r"last 30 days|last 14 days|last quarter|spend|delay|on[- ]time|risky")
+
+
+@st.cache_resource
+def _llm_pool() -> ThreadPoolExecutor:
+    # Process-wide pool: app.py itself re-executes on every rerun
+    return ThreadPoolExecutor(max_workers=4)
+
+
+def _plan_in_background(
+    q: str, token: str, models: List[str], columns: List[str]
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Run the LLM planner off the script thread (racing ``models`` in parallel). The in-flight call is kept in
+    session_state, so a rerun triggered mid-request picks it up instead of re-posting.
+    Repeat questions are answered from llm_router's plan cache without touching the HF router.
+    Returns (plan, model that produced it), model being None for the heuristic fallback plan.
+    """
+    key = hash((q, tuple(models), tuple(sorted(columns))))
+    job = st.session_state.get("llm_future")
+    if job is None or job[0] != key:
+        fut = _llm_pool().submit(llm_plan_first_of, q, token, models, available_columns=columns)
+        job = (key, fut)
+        st.session_state["llm_future"] = job
+    fut = job[1]
+
+    if not fut.done():
+        t0 = time.time()
+        status = st.empty()
+        with st.spinner("Planning…"):
+            # Updating the placeholder lets Streamlit interrupt this wait on widget interaction
+            while not wait([fut], timeout=0.25).done:
+                status.caption(f"Waiting for {', '.join(models)} ({time.time() - t0:.0f}s)")
+        status.empty()
+
+    try:
+        plan, planner_model = fut.result()
+    except Exception:
+        st.session_state.pop("llm_future", None)  # retry on the next submit
+        raise
+    # The enrichment below mutates the plan; keep the stored result pristine
+    return copy.deepcopy(plan), planner_model
+
 
 def main() -> None:
     header(APP_TITLE)
@@ -29,10 +83,19 @@ def main() -> None:
         load_sample,
         load_uploaded,
         validate_columns,
-        derive_features,
+        # Keyed on the UTC date, so the risk flags roll over at midnight, not only on cache expiry
+        lambda d: derive_features(d, asof=datetime.now(timezone.utc).date().isoformat()),
     )
     filters = sidebar_filters(data)
-    df = apply_filters(data, filters)
+    # Prompt-only reruns reuse the sidebar-filtered frame (per dataset and the date its features are for)
+    src = data.attrs.get("source_key")
+    if src:
+        src = (src, data.attrs.get("features_asof"))
+    df = reuse_across_reruns(
+        "_filtered",
+        (src, astuple(filters)) if src else None,
+        lambda: apply_filters(data, filters),
+    )
 
     # --- NLQ UI (bigger + highlighted) ---
     st.divider()
@@ -104,6 +167,9 @@ div[data-testid="stTextArea"] label p {
     use_llm = True  # keep LLM enabled but invisible
     model = get_secret("LLM_MODEL") or "openai/gpt-oss-20b:fireworks-ai"
     token = get_secret("HF_TOKEN")
+    # Optional backup model, queried in parallel with the primary one
+    fallback_model = get_secret("LLM_FALLBACK_MODEL")
+    models = [model] + ([fallback_model] if fallback_model and fallback_model != model else [])
 
     df_for_viz = df
     note: str | None = None
@@ -112,7 +178,7 @@ div[data-testid="stTextArea"] label p {
         if use_llm and token:
             try:
                 # Pass the available columns to improve planning quality
-                raw_plan = llm_plan_via_hf_router(q, token, model, available_columns=list(df.columns))
+                raw_plan, planner_model = _plan_in_background(q, token, models, list(df.columns))
 
                 # ---------- Enrichment step (guarantee keys & fill gaps) ----------
                 # Ensure required keys exist
@@ -121,15 +187,15 @@ div[data-testid="stTextArea"] label p {
                 if raw_plan["filters"] is None:
                     raw_plan["filters"] = {}
 
-                ql = q.lower()
+                hits = {h.replace("on time", "on-time") for h in _KW.findall(q.lower())}
 
                 # Enrich time_range if missing
                 if raw_plan["time_range"] is None:
-                    if "last 30 days" in ql:
+                    if "last 30 days" in hits:
                         raw_plan["time_range"] = {"type": "last_n_days", "n": 30}
-                    elif "last 14 days" in ql:
+                    elif "last 14 days" in hits:
                         raw_plan["time_range"] = {"type": "last_n_days", "n": 14}
-                    elif "last quarter" in ql:
+                    elif "last quarter" in hits:
                         raw_plan["time_range"] = {"type": "last_n_days", "n": 90}
 
                 # Enrich limit if missing
@@ -144,23 +210,29 @@ div[data-testid="stTextArea"] label p {
 
                 # Enrich order_by if missing
                 if raw_plan["order_by"] is None:
-                    if "spend" in ql:
+                    if "spend" in hits:
                         raw_plan["order_by"] = {"metric": "total_landed_cost", "direction": "desc"}
-                    elif "delay" in ql:
+                    elif "delay" in hits:
                         raw_plan["order_by"] = {"metric": "delay_days_vs_planned_eta", "direction": "desc"}
-                    elif "on-time" in ql or "on time" in ql:
+                    elif "on-time" in hits:
                         raw_plan["order_by"] = {"metric": "on_time_percent", "direction": "desc"}
 
                 # If user mentions "risky shipments" and filters lack status, add it
-                if "risky" in ql and "status" not in (raw_plan["filters"] or {}):
+                if "risky" in hits and "status" not in (raw_plan["filters"] or {}):
                     raw_plan["filters"]["status"] = "Delayed"
                 # ---------- End enrichment ----------
 
                 # Optional debug:
                 # st.json(raw_plan)
 
-                df_for_viz = apply_llm_plan(data, df, raw_plan)
-                note = f"LLM plan via {model}: {sanitize_plan(raw_plan, data)}"
+                # Same sidebar filters + same plan (e.g. widget-only reruns) replay the last result
+                df_for_viz = reuse_across_reruns(
+                    "_llm_view",
+                    (src, astuple(filters), json.dumps(raw_plan, sort_keys=True, default=str)) if src else None,
+                    lambda: apply_llm_plan(data, df, raw_plan),
+                )
+                source = f"LLM plan via {planner_model}" if planner_model else "Heuristic plan"
+                note = f"{source}: {sanitize_plan(raw_plan, data)}"
             except Exception as e:
                 df_for_viz, note = apply_prompt_filters(data, df, q)
                 st.info(f"Used fallback parser (LLM error: {e})")
@@ -172,19 +244,21 @@ div[data-testid="stTextArea"] label p {
     # if note:
     #     st.caption(f"🧠 {note}")
 
+    # KPIs + chart aggregates, computed once per filtered frame
+    dash = compute_dashboard(df_for_viz)
+
     # KPIs
     st.divider()
-    kpis = compute_kpis(df_for_viz)
-    render_kpis(kpis)
+    render_kpis(dash["kpis"])
 
     # Table + download
     st.divider()
-    risky_shipments_table(df_for_viz)
-    download_filtered(df_for_viz)
+    risky_shipments_table(df_for_viz, key=dash["key"])
+    download_filtered(df_for_viz, key=dash["key"])
 
     # Charts
     st.divider()
-    render_charts(df_for_viz)
+    render_charts(dash)
 
     # Data dictionary + footer
     st.divider()
@@ -1,12 +1,21 @@
 from __future__ import annotations
 import os
+from typing import Dict
 import streamlit as st
 
+# Found values only: a miss is looked up again, so a secret added while the app runs is picked up
+_FOUND: Dict[str, str] = {}
+
 def get_secret(key: str) -> str | None:
+    v = _FOUND.get(key)
+    if v is not None:
+        return v
     v = os.environ.get(key)
+    if not v:
+        try:
+            v = st.secrets.get(key)  # type: ignore[attr-defined]
+        except Exception:
+            v = None
     if v:
-        return v
-    try:
-        return st.secrets.get(key)  # type: ignore[attr-defined]
-    except Exception:
-        return None
+        _FOUND[key] = v
+    return v or None
@@ -1,15 +1,33 @@
 from __future__ import annotations
+from typing import Any, Dict, Union
+import numpy as np
 import pandas as pd
 import altair as alt
 import streamlit as st
 
-def spend_by_supplier_chart(df: pd.DataFrame) -> alt.Chart:
-    data = (
-        df.groupby("supplier", as_index=False)["total_landed_cost"]
-        .sum()
-        .sort_values("total_landed_cost", ascending=False)
-        .head(12)
+# ---------- aggregations (cached together via dashboard.compute_dashboard) ----------
+def supplier_agg(df: pd.DataFrame) -> pd.DataFrame:
+    """One groupby pass shared by the spend and on-time supplier charts."""
+    return df.groupby("supplier", as_index=False, observed=True).agg(
+        total_landed_cost=("total_landed_cost", "sum"),
+        on_time=("on_time", "mean"),
     )
+
+def lane_agg(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby("lane", as_index=False, observed=True).agg(
+        delay_days_vs_planned_eta=("delay_days_vs_planned_eta", "mean"),
+    )
+
+def lead_time_hist(df: pd.DataFrame, bins: int = 30) -> pd.DataFrame:
+    """Bin lead times server-side so Altair receives `bins` rows instead of every shipment."""
+    vals = df["lead_time_days"].dropna().to_numpy()
+    counts, edges = np.histogram(vals, bins=bins)
+    return pd.DataFrame({"lt_start": edges[:-1], "lt_end": edges[1:], "count": counts})
+
+# ---------- charts (take the pre-aggregated frames) ----------
+def spend_by_supplier_chart(sup: pd.DataFrame) -> alt.Chart:
+    # partial selection of the 12 largest instead of sorting every supplier
+    data = sup[["supplier", "total_landed_cost"]].nlargest(12, "total_landed_cost")
     return (
         alt.Chart(data)
         .mark_bar()
@@ -20,8 +38,8 @@ def spend_by_supplier_chart(df: pd.DataFrame) -> alt.Chart:
         )
     )
 
-def otp_by_supplier_chart(df: pd.DataFrame) -> alt.Chart:
-    data = df.groupby("supplier", as_index=False)["on_time"].mean()
+def otp_by_supplier_chart(sup: pd.DataFrame) -> alt.Chart:
+    data = sup[["supplier", "on_time"]]
     data["on_time_pct"] = data["on_time"] * 100.0
     return (
         alt.Chart(data)
@@ -33,24 +51,24 @@ def otp_by_supplier_chart(df: pd.DataFrame) -> alt.Chart:
         )
     )
 
-def lead_time_hist_chart(df: pd.DataFrame) -> alt.Chart:
-    base = df.dropna(subset=["lead_time_days"])
+def lead_time_hist_chart(hist: pd.DataFrame) -> alt.Chart:
     return (
-        alt.Chart(base)
+        alt.Chart(hist)
         .mark_bar()
         .encode(
-            x=alt.X("lead_time_days:Q", bin=alt.Bin(maxbins=30), title="Lead Time (days)"),
-            y=alt.Y("count()", title="Count"),
-            tooltip=[alt.Tooltip("count()", title="Shipments")],
+            x=alt.X("lt_start:Q", title="Lead Time (days)"),
+            x2="lt_end:Q",
+            y=alt.Y("count:Q", title="Count"),
+            tooltip=[
+                alt.Tooltip("lt_start:Q", title="From", format=".1f"),
+                alt.Tooltip("lt_end:Q", title="To", format=".1f"),
+                alt.Tooltip("count:Q", title="Shipments"),
+            ],
         )
     )
 
-def lane_delay_chart(df: pd.DataFrame) -> alt.Chart:
-    data = (
-        df.groupby("lane", as_index=False)["delay_days_vs_planned_eta"]
-        .mean()
-        .sort_values("delay_days_vs_planned_eta", ascending=False)
-    )
+def lane_delay_chart(lanes: pd.DataFrame) -> alt.Chart:
+    data = lanes.sort_values("delay_days_vs_planned_eta", ascending=False)
     return (
         alt.Chart(data)
         .mark_bar()
@@ -61,19 +79,23 @@ def lane_delay_chart(df: pd.DataFrame) -> alt.Chart:
         )
     )
 
-def render_charts(df: pd.DataFrame) -> None:
+def render_charts(dash: Union[pd.DataFrame, Dict[str, Any]]) -> None:
+    """Render from the parts produced by dashboard.compute_dashboard (or from a frame, computing them)."""
+    if isinstance(dash, pd.DataFrame):
+        from dashboard import compute_dashboard  # local: dashboard imports this module
+        dash = compute_dashboard(dash)
     l, r = st.columns(2)
     with l:
         st.subheader("Spend by Supplier")
-        st.altair_chart(spend_by_supplier_chart(df), use_container_width=True)
+        st.altair_chart(spend_by_supplier_chart(dash["supplier_agg"]), use_container_width=True)
     with r:
         st.subheader("On-time % by Supplier")
-        st.altair_chart(otp_by_supplier_chart(df), use_container_width=True)
+        st.altair_chart(otp_by_supplier_chart(dash["supplier_agg"]), use_container_width=True)
 
     l2, r2 = st.columns(2)
     with l2:
         st.subheader("Lead Time Distribution (days)")
-        st.altair_chart(lead_time_hist_chart(df), use_container_width=True)
+        st.altair_chart(lead_time_hist_chart(dash["lead_time_hist"]), use_container_width=True)
     with r2:
         st.subheader("Lane Delay (avg days vs planned ETA)")
-        st.altair_chart(lane_delay_chart(df), use_container_width=True)
+        st.altair_chart(lane_delay_chart(dash["lane_agg"]), use_container_width=True)
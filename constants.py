@@ -5,6 +5,15 @@ EXPECTED_BASE_COLS = [
     "incoterm", "status", "quantity", "unit_price", "freight_cost", "duty_cost", "shipment_id"
 ]
 EXPECTED_COLS = EXPECTED_BASE_COLS + EXPECTED_DATE_COLS
+# Low-cardinality text columns stored as pandas Categorical at load time
+CATEGORICAL_COLS = ["supplier", "origin_country", "destination_country", "lane", "mode", "incoterm", "status"]
+# High-cardinality identifier columns stored as Arrow-backed strings at load time
+ARROW_STRING_COLS = ["po_number", "shipment_id"]
+# Numeric columns narrowed at load time (half the bytes for every groupby/sum)
+DOWNCAST_INT_COLS = ["quantity"]
+DOWNCAST_FLOAT_COLS = ["unit_price", "freight_cost", "duty_cost"]
+# Timestamp columns planner time_range filters look for, in order (parsed to UTC once in derive_features)
+TIME_RANGE_COLS = ["created_at", "shipment_date", "eta", "updated_at", "date"]
 
 KPI_FORMATS = {
     "total_shipments": "{:,}",
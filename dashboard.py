@@ -0,0 +1,27 @@
+# dashboard.py
+from __future__ import annotations
+from typing import Any, Dict
+import streamlit as st
+import pandas as pd
+
+from data_io import frame_fingerprint
+from kpis import compute_kpis
+from charts import supplier_agg, lane_agg, lead_time_hist
+
+def compute_dashboard(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Everything the KPI row and the charts need, computed together and cached
+    as one entry keyed on a single fingerprint of the frame per rerun.
+    """
+    return _compute_dashboard_cached(frame_fingerprint(df), df)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _compute_dashboard_cached(key: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    df = _df
+    return {
+        "key": key,  # reusable by other per-frame caches (e.g. the CSV download)
+        "kpis": compute_kpis(df, key=key),
+        "supplier_agg": supplier_agg(df),
+        "lane_agg": lane_agg(df),
+        "lead_time_hist": lead_time_hist(df),
+    }
@@ -1,9 +1,14 @@
 # data_io.py
 from __future__ import annotations
+import hashlib
+import os
 import streamlit as st
+import numpy as np
 import pandas as pd
 from typing import Iterable, Optional
-from constants import EXPECTED_DATE_COLS
+from constants import (
+    EXPECTED_DATE_COLS, CATEGORICAL_COLS, ARROW_STRING_COLS, DOWNCAST_INT_COLS, DOWNCAST_FLOAT_COLS,
+)
 
 def _normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
     # Make all expected date columns tz-naive (drop UTC tz)
@@ -13,14 +18,111 @@ def _normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
             df[col] = s.dt.tz_localize(None)   # drop tz info
     return df
 
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    # Categorical codes make equality filters and groupbys cheap integer work
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+def _arrow_strings(df: pd.DataFrame) -> pd.DataFrame:
+    # Identifiers are mostly unique, so categories would not pay off; Arrow strings give
+    # contiguous buffers and C++ compare/isin kernels instead of per-object Python compares
+    try:
+        dtype = pd.StringDtype("pyarrow")
+    except ImportError:
+        return df  # no pyarrow: keep object dtype
+    for col in ARROW_STRING_COLS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def _downcast(df: pd.DataFrame) -> pd.DataFrame:
+    # Narrow numerics (int64 -> int16/int32, float64 -> float32); non-numeric columns are left as-is
+    for cols, kind in ((DOWNCAST_INT_COLS, "integer"), (DOWNCAST_FLOAT_COLS, "float")):
+        for col in cols:
+            if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], downcast=kind)
+    return df
+
+def _sort_by_po_date(df: pd.DataFrame) -> pd.DataFrame:
+    # Time-ordered rows let filters.apply_filters cut the date range with searchsorted (NaT sorts last)
+    if "po_date" in df.columns and pd.api.types.is_datetime64_dtype(df["po_date"]):
+        order = np.argsort(df["po_date"].values, kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        df.attrs["sorted_by"] = "po_date"
+    return df
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    return _sort_by_po_date(_downcast(_arrow_strings(_categorize(_normalize_dates(df)))))
+
+SAMPLE_CSV = "sample_shipments.csv"
+SAMPLE_PARQUET = "sample_shipments.parquet"
+
+def _ensure_parquet() -> str | None:
+    """(Re)build the typed Parquet copy of the sample when missing or older than the CSV."""
+    try:
+        if (
+            not os.path.exists(SAMPLE_PARQUET)
+            or os.path.getmtime(SAMPLE_PARQUET) < os.path.getmtime(SAMPLE_CSV)
+        ):
+            df = pd.read_csv(SAMPLE_CSV, parse_dates=EXPECTED_DATE_COLS, low_memory=False)
+            df.to_parquet(SAMPLE_PARQUET, index=False)
+        return SAMPLE_PARQUET
+    except (OSError, ImportError):
+        return None  # read-only checkout or no parquet engine: stay on CSV
+
 @st.cache_data
 def load_sample() -> pd.DataFrame:
-    df = pd.read_csv("sample_shipments.csv", parse_dates=EXPECTED_DATE_COLS, low_memory=False)
-    return _normalize_dates(df)
+    path = _ensure_parquet()
+    if path:
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(SAMPLE_CSV, parse_dates=EXPECTED_DATE_COLS, low_memory=False)
+    return _prepare(df)
+
+_TIMESTAMP_PARSERS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"]
+
+def _read_csv(file) -> pd.DataFrame:
+    """Parse a CSV with Arrow's multithreaded reader (dates in C++), falling back to pandas.
+
+    Date columns are typed as naive timestamp[ns] up front; anything Arrow can't convert that
+    way (zone offsets, odd formats) raises ArrowInvalid and goes through pandas + _normalize_dates.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        pa = None
+    if pa is not None:
+        opts = pacsv.ConvertOptions(
+            column_types={c: pa.timestamp("ns") for c in EXPECTED_DATE_COLS},
+            timestamp_parsers=_TIMESTAMP_PARSERS,
+            strings_can_be_null=True,  # empty cells -> NaN, as pandas reads them
+        )
+        try:
+            # Default numpy-backed conversion: _prepare's categoricals/downcasts expect numpy dtypes
+            return pacsv.read_csv(file, convert_options=opts).to_pandas()
+        except pa.ArrowInvalid:
+            file.seek(0)
+    return pd.read_csv(file, parse_dates=EXPECTED_DATE_COLS, low_memory=False)
 
 def load_uploaded(file) -> pd.DataFrame:
-    df = pd.read_csv(file, parse_dates=EXPECTED_DATE_COLS, low_memory=False)
-    return _normalize_dates(df)
+    name = (getattr(file, "name", "") or "").lower()
+    if name.endswith(".parquet"):
+        df = pd.read_parquet(file)
+    elif name.endswith(".feather"):
+        df = pd.read_feather(file)
+    else:
+        df = _read_csv(file)
+    return _prepare(df)
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Cheap content key for cache lookups (blake2b over the row hashes, columns and dtypes)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(c, str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
 
 def validate_columns(df: pd.DataFrame, expected: Iterable[str]) -> Optional[str]:
     missing = [c for c in expected if c not in df.columns]
@@ -1,41 +1,88 @@
 from __future__ import annotations
+import streamlit as st
 import pandas as pd
 import numpy as np
+from typing import Optional
+from constants import TIME_RANGE_COLS
 
-def derive_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+def _status_in(status: pd.Series, labels) -> np.ndarray:
+    """Boolean `status in labels`; categorical columns compare int codes instead of strings."""
+    if isinstance(status.dtype, pd.CategoricalDtype):
+        codes = status.cat.categories.get_indexer(labels)
+        codes = codes[codes >= 0].astype(status.cat.codes.dtype)  # -1 would match NaN rows
+        return np.isin(status.cat.codes.to_numpy(), codes)
+    return np.isin(status.to_numpy(), labels)
+
+def _compute_flags(status, actual_eta, planned_eta, eta_passed, delay_days):
+    """Compute on_time and risk_flag together (status as a Series, the rest as raw arrays)."""
+    delivered = _status_in(status, ["Delivered"])
+    on_time = delivered & (actual_eta <= planned_eta)
+    risk = (
+        _status_in(status, ["In-Transit", "Delayed"]) & eta_passed
+    ) | (delivered & (delay_days > 7))
+    return on_time.astype(np.int8), risk.astype(np.int8)
+
+def _days(delta: pd.Series) -> pd.Series:
+    """Whole-day counts in the narrowest lossless dtype (small ints when complete, float32 with NaT gaps)."""
+    days = pd.to_numeric(delta.dt.days, downcast="integer")
+    # NaN keeps the column float; day counts are whole numbers far below 2**24, exact in float32
+    return days.astype(np.float32) if days.dtype == np.float64 else days
+
+DERIVED_COLS = (
+    "po_value", "total_landed_cost", "lead_time_days", "transit_time_days",
+    "delay_days_vs_planned_eta", "on_time", "risk_flag",
+)
+
+@st.cache_data(show_spinner=False, ttl=3600)  # risk_flag depends on "today"
+def derive_features(df: pd.DataFrame, asof: Optional[str] = None) -> pd.DataFrame:
+    """
+    Add derived KPI columns. Cached per input frame and `asof` (the UTC date, YYYY-MM-DD,
+    risk flags are evaluated against; today when None); treat the result as read-only.
+    """
+    unparsed_ts = [
+        c for c in TIME_RANGE_COLS
+        if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c])
+    ]
+    if not unparsed_ts and all(c in df.columns for c in DERIVED_COLS):
+        return df
+    # Shallow copy is enough: we only add/replace whole columns, never mutate existing ones
+    df = df.copy(deep=False)
+    # Parse planner time_range columns here, once, instead of on every LLM plan
+    for c in unparsed_ts:
+        df[c] = pd.to_datetime(df[c], errors="coerce", utc=True)
+    # Parse each date column once and reuse it for every derived column below
+    ase = pd.to_datetime(df["actual_ship_date"], errors="coerce")
+    pod = pd.to_datetime(df["po_date"], errors="coerce")
+    aet = pd.to_datetime(df["actual_eta"], errors="coerce")
+    pet = pd.to_datetime(df["planned_eta"], errors="coerce")
     if "po_value" not in df.columns:
         df["po_value"] = df["quantity"] * df["unit_price"]
     if "total_landed_cost" not in df.columns:
         df["total_landed_cost"] = df["po_value"] + df["freight_cost"] + df["duty_cost"]
     if "lead_time_days" not in df.columns:
-        df["lead_time_days"] = (
-            pd.to_datetime(df["actual_ship_date"]) - pd.to_datetime(df["po_date"])
-        ).dt.days
+        df["lead_time_days"] = _days(ase - pod)
     if "transit_time_days" not in df.columns:
-        df["transit_time_days"] = (
-            pd.to_datetime(df["actual_eta"]) - pd.to_datetime(df["actual_ship_date"])
-        ).dt.days
+        df["transit_time_days"] = _days(aet - ase)
     if "delay_days_vs_planned_eta" not in df.columns:
-        df["delay_days_vs_planned_eta"] = (
-            pd.to_datetime(df["actual_eta"]) - pd.to_datetime(df["planned_eta"])
-        ).dt.days
-    if "on_time" not in df.columns:
-        df["on_time"] = np.where(
-            (df["status"] == "Delivered")
-            & (pd.to_datetime(df["actual_eta"]) <= pd.to_datetime(df["planned_eta"])),
-            1, 0
-        )
-    if "risk_flag" not in df.columns:
-        today = pd.Timestamp.utcnow().date()
-        df["risk_flag"] = np.where(
-            (
-                (df["status"].isin(["In-Transit", "Delayed"]))
-                & (pd.to_datetime(df["planned_eta"]).dt.date < today)
-            ) | (
-                (df["status"] == "Delivered")
-                & (df["delay_days_vs_planned_eta"] > 7)
-            ),
-            1, 0
+        df["delay_days_vs_planned_eta"] = _days(aet - pet)
+    if "on_time" not in df.columns or "risk_flag" not in df.columns:
+        # Midnight UTC as datetime64: `planned_eta < today_ns` == `planned_eta.date() < today`
+        today = pd.Timestamp(asof) if asof else pd.Timestamp.utcnow().tz_localize(None).normalize()
+        today_ns = today.to_datetime64()
+        # Date the flags were computed for: frames built from this one key their reuse on it
+        df.attrs["features_asof"] = today.date().isoformat()
+        pet_ns = pet.values
+        on_time, risk = _compute_flags(
+            df["status"],
+            aet.values,
+            pet_ns,
+            pet_ns < today_ns,
+            df["delay_days_vs_planned_eta"].to_numpy(),
         )
+        if "on_time" not in df.columns:
+            df["on_time"] = on_time
+        if "risk_flag" not in df.columns:
+            df["risk_flag"] = risk
+    # Column lookup set for the planner; row slices of this frame inherit it via attrs
+    df.attrs["col_set"] = frozenset(df.columns)
     return df
@@ -3,8 +3,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Tuple, Dict, Any
 import streamlit as st
+import numpy as np
 import pandas as pd
 import datetime as _dt
+from ui import reuse_across_reruns
 
 @dataclass
 class FilterState:
@@ -15,6 +17,21 @@ class FilterState:
     status: str
 
 # ---------- helpers ----------
+_OPTION_COLS = ("supplier", "lane", "mode", "status")
+
+@st.cache_data(show_spinner=False)
+def _filter_options(df: pd.DataFrame) -> Dict[str, list]:
+    """Selectbox options per column; categorical columns read their categories directly."""
+    opts = {}
+    for c in _OPTION_COLS:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            vals = s.cat.categories.tolist()
+        else:
+            vals = s.dropna().unique().tolist()
+        opts[c] = ["All"] + sorted(vals)
+    return opts
+
 def _data_min_max(df: pd.DataFrame) -> tuple[pd.Timestamp, pd.Timestamp]:
     dmin = pd.to_datetime(df["po_date"], errors="coerce").min().normalize()
     dmax = pd.to_datetime(df["po_date"], errors="coerce").max().normalize()
@@ -85,10 +102,11 @@ def sidebar_filters(df: pd.DataFrame) -> FilterState:
     model: Dict[str, Any] = st.session_state["filters_model"]
 
     # Options
-    suppliers = ["All"] + sorted(df["supplier"].dropna().unique().tolist())
-    lanes     = ["All"] + sorted(df["lane"].dropna().unique().tolist())
-    modes     = ["All"] + sorted(df["mode"].dropna().unique().tolist())
-    statuses  = ["All"] + sorted(df["status"].dropna().unique().tolist())
+    opts = reuse_across_reruns("_filter_options", df.attrs.get("source_key"), lambda: _filter_options(df))
+    suppliers = opts["supplier"]
+    lanes     = opts["lane"]
+    modes     = opts["mode"]
+    statuses  = opts["status"]
 
     # Helper to get index safely
     def _idx(options, value):
@@ -133,17 +151,28 @@ def sidebar_filters(df: pd.DataFrame) -> FilterState:
 def apply_filters(df: pd.DataFrame, f: FilterState) -> pd.DataFrame:
     """Always apply date (default = last 1 year unless user changed it), then selects."""
     end_plus = f.date_range[1] + pd.Timedelta(days=1)
-
-    # tz-naive for safe comparisons
-    po_dt = pd.to_datetime(df["po_date"], errors="coerce").dt.tz_localize(None)
-
-    out = df[(po_dt >= f.date_range[0]) & (po_dt < end_plus)]
+    start, stop = f.date_range[0].to_datetime64(), end_plus.to_datetime64()
+
+    # data_io._normalize_dates already stores po_date as tz-naive datetime64
+    po_dt = df["po_date"]
+    if df.attrs.get("sorted_by") == "po_date" and pd.api.types.is_datetime64_dtype(po_dt):
+        # Rows are time-ordered (data_io._sort_by_po_date): the range is one contiguous slice
+        lo, hi = np.searchsorted(po_dt.values, [start, stop])
+        df = df.iloc[lo:hi]
+        mask = np.ones(len(df), dtype=bool)
+    else:
+        if not pd.api.types.is_datetime64_dtype(po_dt):
+            po_dt = pd.to_datetime(po_dt, errors="coerce").dt.tz_localize(None)
+        po = po_dt.values
+        mask = (po >= start) & (po < stop)
+
+    # Fuse the select filters into one mask and slice once
     if f.supplier != "All":
-        out = out[out["supplier"] == f.supplier]
+        mask &= df["supplier"].values == f.supplier
     if f.lane != "All":
-        out = out[out["lane"] == f.lane]
+        mask &= df["lane"].values == f.lane
     if f.mode != "All":
-        out = out[out["mode"] == f.mode]
+        mask &= df["mode"].values == f.mode
     if f.status != "All":
-        out = out[out["status"] == f.status]
-    return out
+        mask &= df["status"].values == f.status
+    return df.loc[mask]
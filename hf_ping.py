@@ -18,6 +18,7 @@ if not TOKEN:
 MODEL = sys.argv[1] if len(sys.argv) > 1 else "meta-llama/Llama-2-7b-chat-hf"
 URL = f"https://api-inference.huggingface.co/models/{MODEL}"
 HDR = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+SESSION = requests.Session()  # keep-alive pool, so re-pings skip the TCP/TLS handshake
 
 # Llama-2 chat models like the [INST] format; harmless for others too.
 payload = {
@@ -27,7 +28,7 @@ payload = {
 }
 
 t0 = time.time()
-r = requests.post(URL, headers=HDR, json=payload, timeout=120)
+r = SESSION.post(URL, headers=HDR, json=payload, timeout=120)
 print("Model:", MODEL)
 print("Status:", r.status_code, f"({time.time()-t0:.2f}s)")
 print(r.text[:800])
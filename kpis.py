@@ -1,15 +1,30 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, Optional
 import streamlit as st
+import numpy as np
 import pandas as pd
 from constants import KPI_FORMATS
+from data_io import frame_fingerprint
 
-def compute_kpis(df: pd.DataFrame) -> Dict[str, float]:
-    total_shipments = float(len(df))
-    on_time_rate = (df["on_time"].mean() * 100.0) if total_shipments else 0.0
-    avg_lead = float(df["lead_time_days"].mean()) if total_shipments else 0.0
-    late_rate = (df["delay_days_vs_planned_eta"] > 0).mean() * 100.0 if total_shipments else 0.0
-    total_spend = float(df["total_landed_cost"].sum())
+def compute_kpis(df: pd.DataFrame, key: Optional[str] = None) -> Dict[str, float]:
+    """KPIs for `df`, memoized on its fingerprint (pass `key` if the caller already has one)."""
+    return _compute_kpis_cached(key or frame_fingerprint(df), df)
+
+# Leading underscore: Streamlit does not hash `_df`, the fingerprint is the cache key
+@st.cache_data(show_spinner=False, max_entries=16, ttl=600)
+def _compute_kpis_cached(key: str, _df: pd.DataFrame) -> Dict[str, float]:
+    df = _df
+    # Reduce straight on the column arrays (NaN-skipping like the pandas reductions)
+    ot = df["on_time"].to_numpy(dtype=np.float64)
+    lt = df["lead_time_days"].to_numpy(dtype=np.float64)
+    dl = df["delay_days_vs_planned_eta"].to_numpy(dtype=np.float64)
+    ts = df["total_landed_cost"].to_numpy(dtype=np.float64)
+    n = ot.size
+    total_shipments = float(n)
+    on_time_rate = float(np.nanmean(ot)) * 100.0 if n else 0.0
+    avg_lead = float(np.nanmean(lt)) if n else 0.0
+    late_rate = float((dl > 0).mean()) * 100.0 if n else 0.0
+    total_spend = float(np.nansum(ts))
     return dict(
         total_shipments=total_shipments,
         on_time_rate=on_time_rate,
@@ -1,17 +1,65 @@
 # llm_router.py (uses heuristic fallback to build plan when JSON missing)
 from __future__ import annotations
+import asyncio
+import copy
+import hashlib
 import json
 import re
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from nlq_hf import make_hf_messages, build_heuristic_plan
+from nlq_hf import PROMPT_VERSION, make_hf_messages, build_heuristic_plan
+from parsing import decode_first_json
 
 CHAT_URL = "https://router.huggingface.co/v1/chat/completions"
 COMPL_URL = "https://router.huggingface.co/v1/completions"
 
 
+PLAN_CACHE_TTL_S = 3600
+PLAN_CACHE_MAX = 512
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _session() -> requests.Session:
+    """
+    Process-wide session so repeated calls reuse keep-alive connections (no new TCP/TLS handshake).
+    A plain module singleton, not st.cache_resource: it is called from worker threads that have
+    no ScriptRunContext.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                _SESSION = _new_session()
+    return _SESSION
+
+
+def _new_session() -> requests.Session:
+    s = requests.Session()
+    s.headers.update({"Content-Type": "application/json"})
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),  # urllib3 skips POST by default; plan requests are safe to repeat
+        raise_on_status=False,  # hand the last response back so status-code handling below still applies
+    )
+    s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry))
+    return s
+
+# Workers for racing models; kept alive so losing calls can finish in the background
+_RACE_POOL = ThreadPoolExecutor(max_workers=4)
+
+
 def _strip_code_fences(text: str) -> str:
     t = text.strip()
     if t.startswith("```"):
@@ -20,35 +68,6 @@ def _strip_code_fences(text: str) -> str:
     return t.strip()
 
 
-def _extract_json_object(text: str) -> str:
-    s = text
-    start = s.find("{")
-    if start == -1:
-        return s
-    depth = 0
-    in_str = False
-    esc = False
-    for i in range(start, len(s)):
-        c = s[i]
-        if in_str:
-            if esc:
-                esc = False
-            elif c == '\\\\':
-                esc = True
-            elif c == '"':
-                in_str = False
-        else:
-            if c == '"':
-                in_str = True
-            elif c == "{":
-                depth += 1
-            elif c == "}":
-                depth -= 1
-                if depth == 0:
-                    return s[start : i + 1]
-    return s
-
-
 def _normalize_quotes(text: str) -> str:
     return (
         text.replace("“", '"')
@@ -58,54 +77,65 @@ def _normalize_quotes(text: str) -> str:
     )
 
 
-def _remove_trailing_commas(text: str) -> str:
-    return re.sub(r",\s*([}\]])", r"\1", text)
-
-
 def _coerce_to_json_dict_or_none(content: str) -> Optional[Dict[str, Any]]:
-    # Try fast path
-    try:
-        obj = json.loads(content)
-        return obj if isinstance(obj, dict) else None
-    except Exception:
-        pass
+    # Fast path: response_format=json_object usually yields a bare object, skip the sanitizers
+    c = content.strip()
+    if c[:1] == "{" and c[-1:] == "}":
+        try:
+            obj = json.loads(c)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict):
+            return obj
 
     txt = _strip_code_fences(content)
     txt = _normalize_quotes(txt)
-    candidate = _extract_json_object(txt)
-    candidate = _remove_trailing_commas(candidate)
+    start = txt.find("{")
+    if start == -1:
+        return None
+    # raw_decode consumes exactly one JSON value (in C) and ignores any trailing prose
     try:
-        obj = json.loads(candidate)
-        return obj if isinstance(obj, dict) else None
-    except Exception:
+        obj = decode_first_json(txt, start)
+    except ValueError:
         return None
+    return obj if isinstance(obj, dict) else None
 
 
-def _extract_content_from_chat(data: Dict[str, Any]) -> Optional[str]:
-    choices = data.get("choices") or []
-    if not choices:
-        return None
-    first = choices[0]
-    if isinstance(first.get("text"), str) and first["text"].strip():
-        return first["text"]
-    msg = first.get("message")
-    if isinstance(msg, dict):
-        if isinstance(msg.get("content"), str) and msg["content"].strip():
-            return msg["content"]
-        if isinstance(msg.get("reasoning_content"), str) and msg["reasoning_content"].strip():
-            return msg["reasoning_content"]
-    if isinstance(first.get("generated_text"), str) and first["generated_text"].strip():
-        return first["generated_text"]
+def _dict_at(obj: Dict[str, Any], key: str) -> Dict[str, Any]:
+    v = obj.get(key)
+    return v if isinstance(v, dict) else {}
+
+
+def _tool_call_arguments(choice: Dict[str, Any]) -> Optional[str]:
+    for call in _dict_at(choice, "message").get("tool_calls") or []:
+        if isinstance(call, dict):
+            return _dict_at(call, "function").get("arguments")
     return None
 
 
-def _extract_content_from_completions(data: Dict[str, Any]) -> Optional[str]:
+# Where a choice may carry the model's text, in probe order. Completions responses only
+# populate "text", so the first accessor covers that endpoint as well.
+_CHAT_ACCESSORS = (
+    lambda c: c.get("text"),
+    lambda c: _dict_at(c, "message").get("content"),
+    lambda c: _dict_at(c, "message").get("reasoning_content"),
+    # some providers hand back the JSON object already parsed, or as tool-call arguments
+    lambda c: json.dumps(c["message"]["content"]) if isinstance(_dict_at(c, "message").get("content"), dict) else None,
+    _tool_call_arguments,
+    lambda c: c.get("generated_text"),
+    lambda c: _dict_at(c, "delta").get("content"),
+)
+
+
+def _extract_content_from_chat(data: Dict[str, Any]) -> Optional[str]:
     choices = data.get("choices") or []
     if not choices:
         return None
     first = choices[0]
-    if isinstance(first.get("text"), str) and first["text"].strip():
-        return first["text"]
+    for acc in _CHAT_ACCESSORS:
+        v = acc(first)
+        if isinstance(v, str) and v and not v.isspace():
+            return v
     return None
 
 
@@ -119,18 +149,18 @@ def _messages_to_prompt(messages: List[Dict[str, str]]) -> str:
     return "\n".join(lines)
 
 
-def llm_plan_via_hf_router(
+def _request_plan(
     query: str,
     token: str,
     model: str,
     available_columns: Optional[List[str]] = None,
-) -> Dict[str, Any]:
+) -> Optional[Dict[str, Any]]:
     """
     Try chat first; if model not chat, fall back to completions.
-    If the model doesn't return JSON at all, build a heuristic plan so the app still works.
+    Returns None when no usable JSON plan came back (caller builds the heuristic plan).
     """
     messages = make_hf_messages(query, available_columns or [])
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    headers = {"Authorization": f"Bearer {token}"}
 
     # 1) chat
     payload = {
@@ -141,7 +171,7 @@ def llm_plan_via_hf_router(
         "stream": False,
         "response_format": {"type": "json_object"},
     }
-    resp = requests.post(CHAT_URL, headers=headers, json=payload, timeout=90)
+    resp = _session().post(CHAT_URL, headers=headers, json=payload, timeout=90)
 
     if resp.status_code == 400:
         try:
@@ -159,27 +189,29 @@ def llm_plan_via_hf_router(
                 "temperature": 0.0,
                 "stream": False,
             }
-            resp2 = requests.post(COMPL_URL, headers=headers, json=payload2, timeout=90)
+            resp2 = _session().post(COMPL_URL, headers=headers, json=payload2, timeout=90)
             if resp2.status_code >= 400:
                 # Last resort: heuristic plan
-                return build_heuristic_plan(query)
+                return None
             data2 = resp2.json()
-            content2 = _extract_content_from_completions(data2)
+            content2 = _extract_content_from_chat(data2)
             if not content2:
-                return build_heuristic_plan(query)
-            plan = _coerce_to_json_dict_or_none(content2)
-            return plan if plan is not None else build_heuristic_plan(query)
+                return None
+            return _coerce_to_json_dict_or_none(content2)
 
     if resp.status_code >= 400:
         # Heuristic plan on hard errors
-        return build_heuristic_plan(query)
+        return None
 
     data = resp.json()
+    if isinstance(data.get("choices"), list) and not data["choices"]:
+        # The model answered with nothing; a completions retry would not do better
+        return None
     content = _extract_content_from_chat(data)
     if not content:
         # Try completions fetch, else heuristic
         prompt = _messages_to_prompt(messages)
-        resp2 = requests.post(COMPL_URL, headers=headers, json={
+        resp2 = _session().post(COMPL_URL, headers=headers, json={
             "model": model,
             "prompt": prompt,
             "max_tokens": 768,
@@ -188,11 +220,141 @@ def llm_plan_via_hf_router(
         }, timeout=90)
         if resp2.status_code < 400:
             data2 = resp2.json()
-            content2 = _extract_content_from_completions(data2)
+            content2 = _extract_content_from_chat(data2)
             if content2:
-                plan2 = _coerce_to_json_dict_or_none(content2)
-                return plan2 if plan2 is not None else build_heuristic_plan(query)
-        return build_heuristic_plan(query)
+                return _coerce_to_json_dict_or_none(content2)
+        return None
+
+    return _coerce_to_json_dict_or_none(content)
+
+
+def _plan_cache_key(model: str, query: str, available_columns: Optional[List[str]]) -> str:
+    blob = json.dumps(
+        {"v": PROMPT_VERSION, "m": model, "q": query, "c": sorted(available_columns or [])},
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# Process-wide {sha256 key: (stored_at, plan)}; temperature=0 makes plans deterministic.
+# Racing models read and write it from worker threads, so every access holds the lock.
+_PLAN_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
 
-    plan = _coerce_to_json_dict_or_none(content)
+
+def _plan_cache_get(key: str) -> Optional[Dict[str, Any]]:
+    with _PLAN_CACHE_LOCK:
+        hit = _PLAN_CACHE.get(key)
+        if hit is None or time.time() - hit[0] >= PLAN_CACHE_TTL_S:
+            return None
+        _PLAN_CACHE.move_to_end(key)
+        plan = hit[1]
+    return copy.deepcopy(plan)  # stored plans are never mutated, so copying outside the lock is safe
+
+
+def _plan_cache_put(key: str, plan: Dict[str, Any]) -> None:
+    stored = (time.time(), copy.deepcopy(plan))
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE[key] = stored
+        _PLAN_CACHE.move_to_end(key)
+        while len(_PLAN_CACHE) > PLAN_CACHE_MAX:
+            _PLAN_CACHE.popitem(last=False)
+
+
+def _cached_llm_plan(
+    query: str,
+    token: str,
+    model: str,
+    available_columns: Optional[List[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    LLM plan for `query`, serving repeats from a content-addressed cache.
+    Returns None (and caches nothing) when the router gives no usable plan.
+    """
+    key = _plan_cache_key(model, query, available_columns)
+    hit = _plan_cache_get(key)
+    if hit is not None:
+        return hit
+
+    # The HTTP call runs outside the lock; two racers for the same key just both store it
+    plan = _request_plan(query, token, model, available_columns)
+    if plan is None:
+        return None
+    _plan_cache_put(key, plan)
+    return plan
+
+
+def llm_plan_via_hf_router(
+    query: str,
+    token: str,
+    model: str,
+    available_columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Plan `query` with the HF router, serving repeats from a content-addressed cache.
+    If the model doesn't return JSON at all, build a heuristic plan so the app still works
+    (heuristic plans are not cached, so a transient router error is retried next time).
+    """
+    plan = _cached_llm_plan(query, token, model, available_columns)
     return plan if plan is not None else build_heuristic_plan(query)
+
+
+async def allm_plan_via_hf_router(
+    query: str,
+    token: str,
+    model: str,
+    available_columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Awaitable variant of llm_plan_via_hf_router (the blocking HTTP call runs in a worker thread)."""
+    return await asyncio.to_thread(llm_plan_via_hf_router, query, token, model, available_columns)
+
+
+def run_plans_concurrently(
+    prompts: Sequence[str],
+    token: str,
+    model: str,
+    available_columns: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Plan several prompts at once; results are returned in prompt order."""
+    async def _gather() -> List[Dict[str, Any]]:
+        return await asyncio.gather(
+            *(allm_plan_via_hf_router(p, token, model, available_columns) for p in prompts)
+        )
+    return asyncio.run(_gather())
+
+
+def llm_plan_first_of(
+    query: str,
+    token: str,
+    models: Sequence[str],
+    available_columns: Optional[List[str]] = None,
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Send the same query to every model in parallel (e.g. primary + backup) and return
+    (plan, model) for the first LLM plan that comes back. A model that errors or answers
+    without a usable plan drops out of the race; if none answers, the plan is the heuristic
+    one and model is None. Raises only when every model raised.
+    """
+    if len(models) == 1:
+        plan = _cached_llm_plan(query, token, models[0], available_columns)
+        return (plan, models[0]) if plan is not None else (build_heuristic_plan(query), None)
+    pending = {
+        _RACE_POOL.submit(_cached_llm_plan, query, token, m, available_columns): m for m in models
+    }
+    answered = False
+    last_exc: BaseException | None = None
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        # On a tie, prefer the model listed first (the primary)
+        for fut in sorted(done, key=lambda f: models.index(pending[f])):
+            model = pending.pop(fut)
+            if fut.exception() is not None:
+                last_exc = fut.exception()
+                continue
+            answered = True
+            plan = fut.result()
+            if plan is not None:
+                return plan, model
+    if not answered:
+        raise last_exc  # type: ignore[misc]
+    return build_heuristic_plan(query), None
@@ -1,9 +1,11 @@
 # nlq.py
 from __future__ import annotations
 import re
+import numpy as np
 import pandas as pd
 import streamlit as st
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
+from data_io import frame_fingerprint
 
 # ---- Maps & vocab ----
 _METRIC_MAP = {
@@ -25,19 +27,48 @@ _DIM_MAP = {
     "status": "status",
     "statuses": "status",
 }
-_STATUS = {"delayed", "delivered", "in-transit", "in transit", "cancelled", "canceled"}
-_MODE = {"air", "ocean", "road"}
+_STATUS = ("delayed", "delivered", "in-transit", "in transit", "cancelled", "canceled")
+_MODE = ("air", "ocean", "road")
+# metric keywords in lookup priority -> _METRIC_MAP key
+_METRIC_WORDS = {
+    "spend": "spend", "value": "value", "lead time": "lead time", "delay": "delay", "on-time": "on-time",
+    "cost": "spend", "late": "delay", "on time": "on-time", "otp": "on-time",
+}
+
+# ---- Precompiled patterns (text is lower-cased by apply_prompt_filters) ----
+_RE_LAST_N = re.compile(r"last\s+(\d+)\s*(day|week|month|quarter|year)s?")
+_RE_BETWEEN = re.compile(r"between\s+(\d{4}-\d{2}-\d{2})\s+(?:and|to)\s+(\d{4}-\d{2}-\d{2})")
+_RE_ORIGIN = re.compile(r"\bfrom\s+([A-Z]{2})\b")
+_RE_LANE_CC = re.compile(r"\b([A-Z]{2})->([A-Z]{2})\b")
+
+def _alternation(names, word: bool = False) -> Optional[re.Pattern]:
+    # longest first so "acme logistics" wins over "acme" when both are known
+    names = sorted({n for n in names if n}, key=len, reverse=True)
+    if not names: return None
+    alt = "|".join(map(re.escape, names))
+    return re.compile(rf"\b(?:{alt})\b" if word else alt)
+
+# one scan per vocabulary; they can't share a single alternation because
+# their words overlap across vocabularies ("delayed" status vs "delay" metric)
+_RE_STATUS = _alternation(_STATUS)
+_RE_MODE = _alternation(_MODE)
+_RE_METRIC = _alternation(_METRIC_WORDS)
+_RE_DIM = _alternation(_DIM_MAP, word=True)
+_RE_TOP_N_DIM_METRIC = re.compile(r"top\s+(\d+)\s+([a-z\-]+)s?\s+by\s+([a-z\- ]+)")
 
 # ---- Date parsers ----
-def _last_n(text: str) -> Optional[pd.Timedelta]:
-    m = re.search(r"last\s+(\d+)\s*(day|week|month|quarter|year)s?", text)
+def _last_n(text: str) -> Optional[np.timedelta64]:
+    m = _RE_LAST_N.search(text)
     if not m: return None
     n, unit = int(m.group(1)), m.group(2)
     days = {"day":1, "week":7, "month":30, "quarter":90, "year":365}[unit]
-    return pd.Timedelta(days=n*days)
+    return np.timedelta64(n*days, "D")
+
+def _today() -> pd.Timestamp:
+    return pd.Timestamp.utcnow().tz_localize(None).normalize()
 
-def _this_last_period(text: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
-    today = pd.Timestamp.utcnow().tz_localize(None).normalize()
+def _this_last_period(text: str, today: Optional[pd.Timestamp] = None) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+    today = _today() if today is None else today
     if "this year" in text:   return (pd.Timestamp(today.year,1,1), today)
     if "last year" in text:   return (pd.Timestamp(today.year-1,1,1), pd.Timestamp(today.year-1,12,31))
     if "this quarter" in text:
@@ -56,73 +87,119 @@ def _this_last_period(text: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
     return None
 
 def _between_dates(text: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
-    m = re.search(r"between\s+(\d{4}-\d{2}-\d{2})\s+(?:and|to)\s+(\d{4}-\d{2}-\d{2})", text)
+    m = _RE_BETWEEN.search(text)
     if not m: return None
     a, b = pd.to_datetime(m.group(1)), pd.to_datetime(m.group(2))
     start, end = (a, b) if a <= b else (b, a)
     return (start.normalize(), end.normalize())
 
-def _build_date_mask(df: pd.DataFrame, text: str) -> Optional[pd.Series]:
-    po = pd.to_datetime(df["po_date"], errors="coerce").dt.tz_localize(None)
+# every phrase the parsers above understand matches this; any whitespace, like _RE_LAST_N/_RE_BETWEEN
+_RE_DATE_HINT = re.compile(r"(?:last|between|this)\s")
+_ONE_DAY = np.timedelta64(1, "D")
+
+def _po_datetime(df: pd.DataFrame) -> np.ndarray:
+    """po_date as a tz-naive datetime64[ns] array (already that dtype after data_io's load)."""
+    po = df["po_date"]
+    if po.dtype != "datetime64[ns]":
+        po = pd.to_datetime(po, errors="coerce")
+        if po.dt.tz is not None: po = po.dt.tz_localize(None)
+    return po.to_numpy(dtype="datetime64[ns]")
+
+def _in_window(po: np.ndarray, start: np.datetime64, stop: np.datetime64) -> np.ndarray:
+    """`start <= po < stop` in one pass: shift by start, compare unsigned (NaT wraps out of range)."""
+    lo, hi = int(start.astype(np.int64)), int(stop.astype(np.int64))
+    if hi <= lo: return np.zeros(po.shape, dtype=bool)
+    return (po.view("i8") - lo).view("u8") < np.uint64(hi - lo)
+
+def _build_date_mask(df: pd.DataFrame, text: str, today: Optional[pd.Timestamp] = None) -> Optional[np.ndarray]:
+    if not _RE_DATE_HINT.search(text): return None
+    today = _today() if today is None else today
     br = _between_dates(text)
-    if br:
-        start, end = br; return (po >= start) & (po < end + pd.Timedelta(days=1))
-    td = _last_n(text)
+    td = None if br else _last_n(text)
+    pr = None if br or td else _this_last_period(text, today=today)
+    if not (br or td or pr): return None
+    po = _po_datetime(df)
     if td:
-        end = po.max() if pd.notnull(po.max()) else pd.Timestamp.utcnow().tz_localize(None).normalize()
+        known = po[~np.isnat(po)]
+        end = known.max() if known.size else np.datetime64(today, "ns")
         start = end - td
-        return (po >= start) & (po < end + pd.Timedelta(days=1))
-    pr = _this_last_period(text)
-    if pr:
-        start, end = pr; return (po >= start) & (po < end + pd.Timedelta(days=1))
-    return None
+    else:
+        start, end = br or pr
+    # whole days: the window runs up to (not including) the day after `end`
+    return _in_window(po, np.datetime64(start, "ns"), np.datetime64(end, "ns") + _ONE_DAY)
 
 # ---- Text → filters ----
+def _eq_folded(col: pd.Series, value: str, upper: bool = False) -> np.ndarray:
+    """Case-folded `col == value`; categoricals fold their few categories, not every row."""
+    value = value.upper() if upper else value.lower()
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        cats = col.cat.categories.astype(str)
+        hit = np.flatnonzero((cats.str.upper() if upper else cats.str.lower()) == value)
+        return np.isin(col.cat.codes.to_numpy(), hit)  # NaN rows carry code -1, never a hit
+    s = col.str.upper() if upper else col.str.lower()
+    return s.to_numpy() == value
+
+def _first_hit(rgx: re.Pattern, text: str, order) -> Optional[str]:
+    """Keyword of `order` found in `text` that comes first in `order` (not first in the text)."""
+    hits = set(rgx.findall(text))
+    return next((k for k in order if k in hits), None) if hits else None
+
 def _status_from_text(text: str) -> Optional[str]:
-    for s in _STATUS:
-        if s in text:
-            return "In-Transit" if s in {"in-transit","in transit"} else s.capitalize()
-    return None
+    s = _first_hit(_RE_STATUS, text, _STATUS)
+    if not s: return None
+    return "In-Transit" if s in {"in-transit","in transit"} else s.capitalize()
 
 def _mode_from_text(text: str) -> Optional[str]:
-    for m in _MODE:
-        if m in text: return m.capitalize()
-    return None
+    m = _first_hit(_RE_MODE, text, _MODE)
+    return m.capitalize() if m else None
 
 def _origin_from_text(text: str) -> Optional[str]:
-    m = re.search(r"\bfrom\s+([A-Z]{2})\b", text)
+    m = _RE_ORIGIN.search(text)
     return m.group(1) if m else None
 
+def _vocab(df: pd.DataFrame) -> Dict[str, object]:
+    """Supplier/lane vocabulary of `df`, built once per dataset rather than per prompt."""
+    return _vocab_cached(df.attrs.get("source_key") or frame_fingerprint(df), df)
+
+# Leading underscore: Streamlit does not hash `_df`, the key identifies the dataset
+@st.cache_data(show_spinner=False, max_entries=8)
+def _vocab_cached(key: str, _df: pd.DataFrame) -> Dict[str, object]:
+    suppliers = {str(s).lower(): s for s in reversed(_df["supplier"].dropna().unique())}
+    lanes = {str(l).lower(): l for l in reversed(_df["lane"].dropna().unique())}
+    return {
+        "suppliers": suppliers,
+        "supplier_re": _alternation(suppliers),
+        "lanes": lanes,
+        "lane_names": frozenset(str(l) for l in lanes.values()),
+        "lane_re": _alternation(lanes),
+    }
+
 def _supplier_from_text(text: str, df: pd.DataFrame) -> Optional[str]:
-    for s in df["supplier"].dropna().unique():
-        if s.lower() in text: return s
-    return None
+    v = _vocab(df)
+    m = v["supplier_re"].search(text) if v["supplier_re"] else None
+    return v["suppliers"][m.group(0)] if m else None
 
 def _lane_from_text(text: str, df: pd.DataFrame) -> Optional[str]:
+    v = _vocab(df)
     # match explicit lane like "US->IN"
-    m = re.search(r"\b([A-Z]{2})->([A-Z]{2})\b", text)
+    m = _RE_LANE_CC.search(text)
     if m:
         lane = m.group(0)
-        if lane in set(df["lane"].astype(str)): return lane
+        if lane in v["lane_names"]: return lane
     # else try literal lane text
-    for l in df["lane"].dropna().unique():
-        if str(l).lower() in text: return l
-    return None
+    m = v["lane_re"].search(text) if v["lane_re"] else None
+    return v["lanes"][m.group(0)] if m else None
 
 def _metric_from_text(text: str):
-    for key, (col, agg) in _METRIC_MAP.items():
-        if key in text: return col, agg, key
-    if "cost" in text or "spend" in text: return "total_landed_cost","sum","spend"
-    if "value" in text or "po value" in text: return "po_value","sum","value"
-    if "lead time" in text: return "lead_time_days","mean","lead time"
-    if "delay" in text or "late" in text: return "delay_days_vs_planned_eta","mean","delay"
-    if "on time" in text or "on-time" in text or "otp" in text: return "on_time","mean","on-time"
-    return None
+    w = _first_hit(_RE_METRIC, text, _METRIC_WORDS)
+    if not w: return None
+    key = _METRIC_WORDS[w]
+    col, agg = _METRIC_MAP[key]
+    return col, agg, key
 
 def _dimension_from_text(text: str) -> Optional[str]:
-    for k, v in _DIM_MAP.items():
-        if re.search(rf"\b{k}\b", text): return v
-    return None
+    w = _first_hit(_RE_DIM, text, _DIM_MAP)
+    return _DIM_MAP[w] if w else None
 
 # ==== NEW: turn a prompt into a DataFrame we can chart/KPI ====
 def apply_prompt_filters(df_all: pd.DataFrame, df_filtered: pd.DataFrame, prompt: str) -> Tuple[pd.DataFrame, str]:
@@ -133,32 +210,38 @@ def apply_prompt_filters(df_all: pd.DataFrame, df_filtered: pd.DataFrame, prompt
       - If 'top N <dim> by <metric>' is requested, we reduce to only those top N groups.
     """
     text = (prompt or "").strip().lower()
+    today = _today()  # one clock read per prompt, shared by every date helper
     base = df_all if "all data" in text else df_filtered
-    df = base.copy()
     applied = []
 
-    # filters
+    # filters: AND every predicate into one mask over `base`, then slice once
+    mask = np.ones(len(base), dtype=bool)
+
     s = _status_from_text(text)
-    if s: df = df[df["status"].str.lower() == s.lower()]; applied.append(f"status={s}")
+    if s: mask &= _eq_folded(base["status"], s); applied.append(f"status={s}")
 
     m = _mode_from_text(text)
-    if m: df = df[df["mode"].str.lower() == m.lower()]; applied.append(f"mode={m}")
+    if m: mask &= _eq_folded(base["mode"], m); applied.append(f"mode={m}")
 
     o = _origin_from_text(text)
-    if o: df = df[df["origin_country"].str.upper() == o.upper()]; applied.append(f"origin={o}")
+    if o: mask &= _eq_folded(base["origin_country"], o, upper=True); applied.append(f"origin={o}")
 
     sup = _supplier_from_text(text, df_all)
-    if sup: df = df[df["supplier"] == sup]; applied.append(f"supplier='{sup}'")
+    if sup: mask &= base["supplier"].to_numpy() == sup; applied.append(f"supplier='{sup}'")
 
     lane = _lane_from_text(text, df_all)
-    if lane: df = df[df["lane"] == lane]; applied.append(f"lane={lane}")
+    if lane: mask &= base["lane"].to_numpy() == lane; applied.append(f"lane={lane}")
 
-    dm = _build_date_mask(df, text)
+    # date window is resolved on the full base (e.g. "last 3 months" ends at base's latest PO)
+    dm = _build_date_mask(base, text, today=today)
     if dm is not None:
-        df = df[dm]; applied.append("date range")
+        mask &= dm; applied.append("date range")
+
+    # read-only from here on, so an unfiltered prompt hands back `base` itself
+    df = base[mask] if applied else base
 
     # top N dim by metric -> keep only those groups so charts/KPIs reflect that slice
-    mtop = re.search(r"top\s+(\d+)\s+([a-z\-]+)s?\s+by\s+([a-z\- ]+)", text)
+    mtop = _RE_TOP_N_DIM_METRIC.search(text)
     if mtop:
         n = int(mtop.group(1))
         dim_key = mtop.group(2).strip()
@@ -167,8 +250,8 @@ def apply_prompt_filters(df_all: pd.DataFrame, df_filtered: pd.DataFrame, prompt
         metric = _metric_from_text(met_key) or _metric_from_text(text)
         if dim and metric and dim in df.columns:
             col, agg, key = metric
-            g = df.groupby(dim, as_index=False)[col].agg(agg).sort_values(col, ascending=False).head(n)
-            df = df[df[dim].isin(g[dim])]
+            top = df.groupby(dim, sort=False, observed=True)[col].agg(agg).nlargest(n)
+            df = df[df[dim].isin(set(top.index))]
             applied.append(f"top {n} {dim} by {key}")
 
     note = "Prompt on " + ("all data" if base is df_all else "filtered data")
@@ -1,5 +1,7 @@
 # nlq_hf.py (LLM-led fuzzy entity mapping + richer instructions for statuses)
 from __future__ import annotations
+import functools
+import json
 import re
 from typing import List, Dict, Any, Optional, Union
 
@@ -39,11 +41,40 @@ STATUS_SYNONYMS = {
 }
 
 
+# ---- Precompiled patterns ----
+_RE_NUM_WORDS = re.compile(r"\b(" + "|".join(_WORD_TO_NUM) + r")\b", re.IGNORECASE)
+
+
+def _top_limit_patterns() -> List[tuple]:
+    patterns = []
+    for dim, aliases in DIMENSION_ALIASES.items():
+        alias_pat = r"(?:%s)" % "|".join(map(re.escape, aliases))
+        patterns.append((dim, re.compile(rf"\b(?:top|limit)\s+(\d+)\s+{alias_pat}\b")))
+        patterns.append((dim, re.compile(rf"\b(?:top|limit)\s+(\d+)\s+{alias_pat}s\b")))
+    return patterns
+
+
+_TOP_LIMIT_PATTERNS = _top_limit_patterns()
+_RE_SUPPLIER_NAME = re.compile(r"(?:supplier|vendor)\s+([a-z0-9\-\s&\.]+)")
+_STATUS_SYN_PATTERNS = {
+    label: re.compile(r"\b(?:" + "|".join(map(re.escape, syns)) + r")\b", re.I)
+    for label, syns in STATUS_SYNONYMS.items()
+}
+# "by <metric>" phrases in priority order -> order_by metric
+_ORDER_BY_METRICS = (
+    ("spend", "total_landed_cost"),
+    ("delay", "delay_days_vs_planned_eta"),
+    ("on-time", "on_time_percent"),
+    ("on time", "on_time_percent"),
+)
+_RE_ORDER_BY = re.compile(r"by (" + "|".join(re.escape(w) for w, _ in _ORDER_BY_METRICS) + ")")
+
+
 def _normalize_number_words_to_digits(text: str) -> str:
     def repl(m):
         w = m.group(0).lower()
         return str(_WORD_TO_NUM.get(w, w))
-    return re.sub(r"\b(" + "|".join(_WORD_TO_NUM.keys()) + r")\b", repl, text, flags=re.IGNORECASE)
+    return _RE_NUM_WORDS.sub(repl, text)
 
 
 def _available_col_hints(available_columns: List[str]) -> str:
@@ -84,6 +115,9 @@ def _value_hints(value_hints: Dict[str, List[str]] | None) -> str:
     return "\n".join(lines)
 
 
+# Bump whenever the prompt/few-shots change: it is part of llm_router's plan-cache key
+PROMPT_VERSION = "v1"
+
 PLANNER_SYSTEM_PROMPT = """
 You are a planner that converts a user's shipment analytics request into a single JSON object called a "plan".
 Your output MUST be valid JSON and MUST contain the keys below (use null when a key does not apply). Do not output any text outside JSON.
@@ -162,6 +196,19 @@ FEW_SHOTS = [
     }
 ]
 
+# Static prompt parts, built once at import
+_DIMENSION_HINT_STR = _dimension_hint()
+_METRIC_HINT_STR = _metric_hint()
+# Few-shot exemplars (assistant replies are raw JSON only)
+_FEWSHOT_MESSAGES = tuple(
+    m
+    for ex in FEW_SHOTS
+    for m in (
+        {"role": "user", "content": ex["user"]},
+        {"role": "assistant", "content": json.dumps(ex["assistant"])},
+    )
+)
+
 
 def make_hf_messages(
     query: str,
@@ -172,50 +219,49 @@ def make_hf_messages(
     - If a list is passed, it's treated as the available COLUMNS (old behavior).
     - If a dict is passed, it's treated as VALUE HINTS for fuzzy-mapping (e.g., suppliers list).
     """
-    query_norm = _normalize_number_words_to_digits(query)
-
-    col_hints = ""
-    value_hints_txt = ""
     if isinstance(available_columns_or_hints, list):
-        col_hints = _available_col_hints(available_columns_or_hints or [])
+        hints_key = ("columns", tuple(available_columns_or_hints))
     elif isinstance(available_columns_or_hints, dict):
-        value_hints_txt = _value_hints(available_columns_or_hints)
+        hints_key = ("values", tuple((k, tuple(v or ())) for k, v in available_columns_or_hints.items()))
+    else:
+        hints_key = (None, ())
+    # The cached messages are shared: hand out fresh dicts
+    return [dict(m) for m in _make_hf_messages_cached(query, hints_key)]
+
+
+@functools.lru_cache(maxsize=256)
+def _make_hf_messages_cached(query: str, hints_key: tuple) -> tuple:
+    query_norm = _normalize_number_words_to_digits(query)
+
+    kind, payload = hints_key
+    col_hints = _available_col_hints(list(payload)) if kind == "columns" else ""
+    value_hints_txt = _value_hints(dict(payload)) if kind == "values" else ""
 
     hints = "\n".join(
         h for h in [
             col_hints,
             value_hints_txt,
-            _dimension_hint(),
-            _metric_hint()
+            _DIMENSION_HINT_STR,
+            _METRIC_HINT_STR,
         ] if h
     )
 
     system = PLANNER_SYSTEM_PROMPT + ("\n\n" + hints if hints else "")
 
-    messages: List[Dict[str, str]] = [{"role": "system", "content": system}]
-
-    # Few-shot exemplars (assistant replies are raw JSON only)
-    import json as _json
-    for ex in FEW_SHOTS:
-        messages.append({"role": "user", "content": ex["user"]})
-        messages.append({"role": "assistant", "content": _json.dumps(ex["assistant"])})
-
-    messages.append({
-        "role": "user",
-        "content": f"User question: {query_norm}\nReturn ONLY the JSON plan with all required keys."
-    })
-    return messages
+    return (
+        {"role": "system", "content": system},
+        *_FEWSHOT_MESSAGES,
+        {
+            "role": "user",
+            "content": f"User question: {query_norm}\nReturn ONLY the JSON plan with all required keys."
+        },
+    )
 
 
 # Heuristic helpers (kept for hybrid fallback in router)
 def extract_top_limit_from_text(query: str) -> Optional[Dict[str, Any]]:
     q = _normalize_number_words_to_digits(query.lower())
-    patterns = []
-    for dim, aliases in DIMENSION_ALIASES.items():
-        alias_pat = r"(?:%s)" % "|".join(map(re.escape, aliases))
-        patterns.append((dim, re.compile(rf"\b(?:top|limit)\s+(\d+)\s+{alias_pat}\b")))
-        patterns.append((dim, re.compile(rf"\b(?:top|limit)\s+(\d+)\s+{alias_pat}s\b")))
-    for dim, pat in patterns:
+    for dim, pat in _TOP_LIMIT_PATTERNS:
         m = pat.search(q)
         if m:
             try:
@@ -243,11 +289,13 @@ def build_heuristic_plan(query: str) -> Dict[str, Any]:
 
     # filters (includes risky/delayed synonyms)
     filters: Dict[str, Any] = {}
-    if any(w in ql for w in STATUS_SYNONYMS["Delayed"]):
-        filters["status"] = "Delayed"
+    for label, rgx in _STATUS_SYN_PATTERNS.items():
+        if rgx.search(ql):
+            filters["status"] = label
+            break
 
     # naive supplier capture (still let LLM correct via few-shots when used)
-    m = re.search(r"(?:supplier|vendor)\s+([a-z0-9\-\s&\.]+)", ql)
+    m = _RE_SUPPLIER_NAME.search(ql)
     if m:
         supplier_name = m.group(1).strip().title()
         filters["supplier"] = supplier_name
@@ -270,12 +318,10 @@ def build_heuristic_plan(query: str) -> Dict[str, Any]:
         group_by = limit["dimension"]
         order_by = {"metric": limit["metric"], "direction": "desc"}
     else:
-        if "by spend" in ql:
-            order_by = {"metric": "total_landed_cost", "direction": "desc"}
-        elif "by delay" in ql:
-            order_by = {"metric": "delay_days_vs_planned_eta", "direction": "desc"}
-        elif "by on-time" in ql or "by on time" in ql:
-            order_by = {"metric": "on_time_percent", "direction": "desc"}
+        hits = set(_RE_ORDER_BY.findall(ql))
+        metric = next((col for w, col in _ORDER_BY_METRICS if w in hits), None)
+        if metric:
+            order_by = {"metric": metric, "direction": "desc"}
 
     return {
         "time_range": time_range,
@@ -3,53 +3,69 @@ import re
 import json
 import ast
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+_JSON_DECODER = json.JSONDecoder()
+_RE_JSON_TAG = re.compile(r"<json>\s*(\{.*?\})\s*</json>", flags=re.S | re.I)
+_RE_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def remove_trailing_commas(text: str) -> str:
+    return _RE_TRAILING_COMMA.sub(r"\1", text)
+
+def decode_first_json(txt: str, start: int = 0) -> Any:
+    """
+    Decode the JSON value starting at `txt[start]` with raw_decode (one C scan, trailing
+    prose ignored); retry once without trailing commas. Raises ValueError if both fail.
+    """
+    try:
+        return _JSON_DECODER.raw_decode(txt, start)[0]
+    except ValueError:
+        return _JSON_DECODER.raw_decode(remove_trailing_commas(txt[start:]))[0]
 
 def extract_json(txt: str) -> Dict[str, Any]:
     """
     Robustly extract a JSON object from model output.
     - Prefer <json>{...}</json> block
     - Strip code fences if present
-    - Fallback to first {...} block
-    - Try json.loads, then json5 (if installed), then ast.literal_eval
+    - Decode the first {...} object, then retry without trailing commas
+    - Fall back to ast.literal_eval for Python-style dicts
     """
     if not txt:
         return {}
     txt = txt.strip()
 
-    m = re.search(r"<json>\s*(\{.*?\})\s*</json>", txt, flags=re.S | re.I)
+    m = _RE_JSON_TAG.search(txt)
     if m:
-        s = m.group(1)
+        txt = m.group(1)
     else:
         txt = txt.replace("```json", "```").replace("```JSON", "```")
         if "```" in txt:
             parts = [p for p in txt.split("```") if "{" in p]
             if parts:
                 txt = parts[0]
-        m = re.search(r"\{.*\}", txt, flags=re.S)
-        s = m.group(0) if m else txt
 
-    try:
-        return json.loads(s)
-    except Exception:
+    start = txt.find("{")
+    if start != -1:
         try:
-            import json5  # type: ignore
-            return json5.loads(s)  # type: ignore
-        except Exception:
+            return decode_first_json(txt, start)
+        except ValueError:
             pass
-        try:
-            obj = ast.literal_eval(s)
-            return obj if isinstance(obj, dict) else {}
-        except Exception as e:
-            raise ValueError(f"Could not parse JSON: {e}. Snippet: {s[:300]}")
+    # first "{" .. last "}" (what a greedy {.*} match would have spanned)
+    s = txt[start:txt.rfind("}") + 1] if start != -1 else txt
+    try:
+        obj = ast.literal_eval(s)
+        return obj if isinstance(obj, dict) else {}
+    except Exception as e:
+        raise ValueError(f"Could not parse JSON: {e}. Snippet: {s[:300]}")
 
-def resolve_relative_date_phrase(s: str) -> dict:
+def resolve_relative_date_phrase(s: str, today: Optional[pd.Timestamp] = None) -> dict:
     """
     Map phrases like 'last week', 'last 30 days', 'yesterday', 'today' to absolute dates.
-    Uses local today (no timezone).
+    Uses local today (no timezone) unless the caller passes its own `today`.
     """
     s = (s or "").lower().strip()
-    today = pd.Timestamp.today().normalize()
+    if today is None:
+        today = pd.Timestamp.today().normalize()
 
     def iso(d): return d.date().isoformat()
 
@@ -1,7 +1,14 @@
 # planner.py
 from __future__ import annotations
+import json
 from typing import Any, Dict, Tuple
+import numpy as np
 import pandas as pd
+try:
+    import orjson  # optional C serializer for plan captions
+except ImportError:
+    orjson = None
+from constants import TIME_RANGE_COLS
 
 # Keep this aligned with nlq_hf.DEFAULT_METRIC_ALIASES
 _METRIC_ALIASES = {
@@ -17,108 +24,194 @@ _METRIC_ALIASES = {
 }
 
 _DIMENSIONS = {"supplier", "lane", "mode", "status"}
+_NS_PER_DAY = 86_400_000_000_000
+
+def _columns(df: pd.DataFrame) -> frozenset:
+    """derive_features' cached column set, unless the frame's columns have changed since."""
+    cols = df.attrs.get("col_set")
+    return cols if cols is not None and len(cols) == df.shape[1] else frozenset(df.columns)
 
 def _resolve_metric(df: pd.DataFrame, metric: str | None) -> str | None:
+    cols = _columns(df)
     if not metric:
         # default to spend if present
         for alias in ["spend", "total_spend", "landed_cost", "cost"]:
             col = _METRIC_ALIASES.get(alias, alias)
-            if col in df.columns:
+            if col in cols:
                 return col
         return None
     # map alias -> column if needed
     col = _METRIC_ALIASES.get(metric, metric)
-    return col if col in df.columns else None
+    return col if col in cols else None
 
-def _apply_filters(df: pd.DataFrame, filters: Dict[str, Any] | None) -> pd.DataFrame:
+def _member_mask(s: pd.Series, values: list) -> np.ndarray:
+    """Boolean `s in values`; categoricals match in integer-code space."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.categories.get_indexer(values)
+        codes = codes[codes >= 0]  # values outside the categories (or NaN) match no row
+        if codes.size == 1:
+            return s.cat.codes.to_numpy() == codes[0]  # plain scalar compare, no isin setup
+        return np.isin(s.cat.codes.to_numpy(), codes)
+    vals = np.asarray(values)
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biuf" and vals.dtype.kind in "biuf":
+        # plain numeric column and values: vectorised compare over the raw array
+        return np.isin(s.to_numpy(), vals)
+    # strings/objects/mixed types: pandas' hashtable (or Arrow's is_in) is the faster path
+    return s.isin(values).to_numpy(dtype=bool, na_value=False)
+
+def _group_codes(s: pd.Series) -> Tuple[np.ndarray, int]:
+    """(codes, n_groups) for a dimension column; -1 marks missing keys."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), len(s.cat.categories)
+    codes, uniques = pd.factorize(s, sort=False)
+    return codes, len(uniques)
+
+def _apply_mask(df: pd.DataFrame, mask: np.ndarray | None) -> pd.DataFrame:
+    return df if mask is None else df[mask]
+
+def _filters_mask(df: pd.DataFrame, filters: Dict[str, Any] | None) -> np.ndarray | None:
+    """Row mask for `filters` over `df` (None when no filter names a column)."""
     if not filters:
-        return df
-    out = df
+        return None
+    cols = _columns(df)
+    mask = None
     for k, v in filters.items():
-        if k in out.columns:
+        if k in cols:
             # support list-of-values OR scalar
             if isinstance(v, (list, tuple, set)):
-                out = out[out[k].isin(list(v))]
+                m = _member_mask(df[k], list(v))
+            elif isinstance(df[k].dtype, pd.CategoricalDtype):
+                m = _member_mask(df[k], [v])
             else:
-                out = out[out[k] == v]
-    return out
+                # nullable dtypes (e.g. the Arrow-string ID columns) give NA for missing keys: no match
+                m = (df[k] == v).to_numpy(dtype=bool, na_value=False)
+            # AND into one buffer as we go (every m is freshly allocated, so it can be reused)
+            mask = m if mask is None else np.logical_and(mask, m, out=mask)
+    return mask
 
-def _apply_time_range(df: pd.DataFrame, time_range: Dict[str, Any] | None) -> pd.DataFrame:
+def _apply_filters(df: pd.DataFrame, filters: Dict[str, Any] | None) -> pd.DataFrame:
+    return _apply_mask(df, _filters_mask(df, filters))
+
+def _time_range_mask(df: pd.DataFrame, time_range: Dict[str, Any] | None) -> np.ndarray | None:
+    """Row mask for `time_range` over `df` (None when it does not apply)."""
     if not time_range:
-        return df
+        return None
     # Implement your own timestamp column name if needed
     ts_col = None
-    for candidate in ["created_at", "shipment_date", "eta", "updated_at", "date"]:
-        if candidate in df.columns:
+    cols = _columns(df)
+    for candidate in TIME_RANGE_COLS:
+        if candidate in cols:
             ts_col = candidate
             break
     if not ts_col:
-        return df
+        return None
     ty = time_range.get("type")
     if ty == "last_n_days":
         n = int(time_range.get("n", 30))
-        # Expect df[ts_col] is datetime64; if not, try to convert
+        # derive_features has already parsed it; convert only frames that bypassed it
         s = df[ts_col]
         if not pd.api.types.is_datetime64_any_dtype(s):
             s = pd.to_datetime(s, errors="coerce", utc=True)
-        cutoff = pd.Timestamp.utcnow() - pd.Timedelta(days=n)
-        return df[s >= cutoff]
-    return df
+        # Compare raw UTC nanoseconds (NaT is int64 min, so it always falls before the cutoff)
+        cutoff_ns = np.int64(pd.Timestamp.utcnow().value) - np.int64(n) * _NS_PER_DAY
+        ts_ns = s.to_numpy(dtype="datetime64[ns]").view("i8")
+        return ts_ns >= cutoff_ns
+    return None
 
-def _apply_limit(df: pd.DataFrame, limit: Dict[str, Any] | None) -> pd.DataFrame:
+def _apply_time_range(df: pd.DataFrame, time_range: Dict[str, Any] | None) -> pd.DataFrame:
+    return _apply_mask(df, _time_range_mask(df, time_range))
+
+def _limit_mask(
+    df: pd.DataFrame, limit: Dict[str, Any] | None, rows: np.ndarray | None = None
+) -> np.ndarray | None:
     """
-    Enforce: {"dimension": "<supplier|lane|mode|status>", "n": N, "metric": "<col>"}
-    Applies after filters/time range. Aggregation uses sum by default.
+    Row mask keeping the top-N groups of `limit`, ranked over the rows selected by `rows`
+    (all rows when None) and restricted to them. Returns `rows` when the limit does not apply.
     """
     if not limit:
-        return df
+        return rows
     dim = (limit.get("dimension") or "").strip()
-    if dim not in _DIMENSIONS or dim not in df.columns:
-        return df
+    if dim not in _DIMENSIONS or dim not in _columns(df):
+        return rows
     try:
         n = int(limit.get("n", 5))
         if n <= 0:
-            return df
+            return rows
     except Exception:
-        return df
-    metric_col = _resolve_metric(df, limit.get("metric"))
-    # If metric missing but user asked limit by status (counts), allow count-based top-N
-    if metric_col is None:
-        # fallback to count of rows per dim
-        top_keys = (
-            df.groupby(dim).size().sort_values(ascending=False).head(n).index
-        )
-        return df[df[dim].isin(top_keys)]
-    # numeric aggregation by sum
-    g = df.groupby(dim)[metric_col].sum().sort_values(ascending=False)
-    top_keys = g.head(n).index
-    return df[df[dim].isin(top_keys)]
+        return rows
+    return _limit_kernel(df, rows, dim, _resolve_metric(df, limit.get("metric")), n)
+
+def _limit_kernel(
+    df: pd.DataFrame, rows: np.ndarray | None, dim: str, metric_col: str | None, n: int
+) -> np.ndarray:
+    """Mask of the top-N `dim` groups over `rows`, by `metric_col` sum (row count if None/non-numeric)."""
+    # categorical codes (or one factorize); -1 marks missing keys, which never make the cut
+    codes, n_groups = _group_codes(df[dim])
+    valid = codes >= 0
+    if rows is not None:
+        valid &= rows
+    c = codes[valid]
+    counts = np.bincount(c, minlength=n_groups)
+    group_ids = np.flatnonzero(counts)  # observed groups only, like groupby(observed=True)
+    if metric_col is None or not pd.api.types.is_numeric_dtype(df[metric_col]):
+        # If metric missing (or not summable, e.g. a text column), rank by row count
+        scores = counts[group_ids]
+    else:
+        # numeric aggregation by sum: one weighted bincount pass, no sort (NaN adds 0)
+        vals = np.nan_to_num(df[metric_col].to_numpy(dtype=np.float64)[valid])
+        scores = np.bincount(c, weights=vals, minlength=n_groups)[group_ids]
+    top = np.argpartition(-scores, n - 1)[:n] if n < scores.size else slice(None)
+    keep = np.zeros(n_groups + 1, dtype=bool)  # trailing slot is what code -1 indexes
+    keep[group_ids[top]] = True
+    mask = keep[codes]
+    return mask if rows is None else np.logical_and(mask, rows, out=mask)
+
+def _apply_limit(df: pd.DataFrame, limit: Dict[str, Any] | None) -> pd.DataFrame:
+    """
+    Enforce: {"dimension": "<supplier|lane|mode|status>", "n": N, "metric": "<col>"}
+    Applies after filters/time range. Aggregation uses sum by default.
+    """
+    return _apply_mask(df, _limit_mask(df, limit))
 
 def sanitize_plan(plan: Dict[str, Any], df_like: Any | None = None) -> str:
     """Compact representation for UI captions/logging."""
+    if orjson is not None:
+        try:
+            # 800 chars are at most 3200 UTF-8 bytes: decode only that prefix ("ignore" drops a cut char)
+            return orjson.dumps(plan)[:3200].decode("utf-8", "ignore")[:800]
+        except TypeError:
+            pass  # e.g. non-str keys: let the stdlib path try
     try:
-        import json
         return json.dumps(plan, ensure_ascii=False)[:800]
     except Exception:
         return str(plan)[:800]
 
+def _build_mask(df: pd.DataFrame, plan: Dict[str, Any]) -> np.ndarray | None:
+    """Combined time_range + filters row mask over `df` (None when neither applies)."""
+    # Time range first
+    mask = _time_range_mask(df, plan.get("time_range"))
+    # Filters next, ANDed into the same buffer
+    fm = _filters_mask(df, plan.get("filters"))
+    if fm is not None:
+        mask = fm if mask is None else np.logical_and(mask, fm, out=mask)
+    return mask
+
 def apply_llm_plan(data: pd.DataFrame, df: pd.DataFrame, plan: Dict[str, Any]) -> pd.DataFrame:
     """
     Apply the JSON plan produced by the LLM to the dataframe.
     This function focuses on filters, time_range, and the new 'limit' block.
     It is intentionally conservative to avoid surprises.
     """
-    out = df
-
-    # Time range first
-    out = _apply_time_range(out, plan.get("time_range"))
+    # Nothing to apply (e.g. a plan that only sets group_by/order_by): hand back df as-is
+    if not (plan.get("time_range") or plan.get("filters") or plan.get("limit")):
+        return df
 
-    # Filters next
-    out = _apply_filters(out, plan.get("filters"))
+    # Every step works on row masks over `df`; the frame is sliced once at the end.
+    mask = _build_mask(df, plan)
 
-    # Limit by dimension
-    out = _apply_limit(out, plan.get("limit"))
+    # Limit by dimension, ranked over the rows that survived the steps above
+    mask = _limit_mask(df, plan.get("limit"), mask)
 
     # Optional: ordering/grouping can be added here if you already support it elsewhere.
     # We keep it minimal for "this work only".
-    return out
+    return _apply_mask(df, mask)
@@ -1,24 +1,61 @@
 from __future__ import annotations
+from typing import Optional
 import streamlit as st
 import pandas as pd
+from data_io import frame_fingerprint
 
-def risky_shipments_table(df: pd.DataFrame) -> None:
+_RISKY_COLS = [
+    "shipment_id", "po_number", "supplier", "lane", "mode", "status",
+    "po_date", "planned_eta", "actual_eta", "delay_days_vs_planned_eta", "total_landed_cost",
+]
+
+def _risky_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Mask and project in one step: only the shown columns are gathered, sort_values copies once
+    view = df.loc[df["risk_flag"].to_numpy() == 1, _RISKY_COLS]
+    return view.sort_values("delay_days_vs_planned_eta", ascending=False)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _risky_rows_cached(key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    return _risky_rows(_df)
+
+def risky_shipments_table(df: pd.DataFrame, key: Optional[str] = None) -> None:
+    """Risky rows of `df`, most delayed first; with a frame `key` the view is built once per frame."""
     st.subheader("🚨 Risky Shipments")
-    cols = [
-        "shipment_id", "po_number", "supplier", "lane", "mode", "status",
-        "po_date", "planned_eta", "actual_eta", "delay_days_vs_planned_eta", "total_landed_cost",
-    ]
-    view = df[df["risk_flag"] == 1].copy()
+    view = _risky_rows_cached(key, df) if key else _risky_rows(df)
     if not view.empty:
-        st.dataframe(
-            view[cols].sort_values("delay_days_vs_planned_eta", ascending=False),
-            use_container_width=True,
-        )
+        st.dataframe(view, use_container_width=True)
     else:
         st.info("No risky shipments under the current filters.")
 
-def download_filtered(df: pd.DataFrame) -> None:
-    csv = df.to_csv(index=False).encode("utf-8")
+# Leading underscore: Streamlit does not hash `_df`, the fingerprint is the cache key
+@st.cache_data(show_spinner=False, max_entries=8)
+def _csv_bytes(key: str, _df: pd.DataFrame) -> bytes:
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return _df.to_csv(index=False).encode("utf-8")
+    try:
+        table = pa.Table.from_pandas(_df, preserve_index=False)
+        # Date-only timestamps are written as YYYY-MM-DD, like to_csv does. The date32 cast
+        # truncates silently, so only cast naive columns that are exactly midnight-aligned;
+        # tz-aware columns keep their full timestamp and offset (to_csv writes those in full too)
+        for i, field in enumerate(table.schema):
+            if pa.types.is_timestamp(field.type) and field.type.tz is None:
+                col = table.column(i)
+                midnight = pc.all(pc.equal(pc.floor_temporal(col, unit="day"), col))
+                if midnight.as_py() is not False:  # None: all-null column, nothing to lose
+                    table = table.set_column(i, field.name, pc.cast(col, pa.date32()))
+        sink = pa.BufferOutputStream()
+        pacsv.write_csv(table, sink)  # multi-threaded C++ writer, bytes out directly
+        return sink.getvalue().to_pybytes()
+    except (pa.ArrowException, TypeError, ValueError):
+        return _df.to_csv(index=False).encode("utf-8")
+
+def download_filtered(df: pd.DataFrame, key: Optional[str] = None) -> None:
+    """CSV download of `df`, encoded once per frame (pass `key` if the caller already has one)."""
+    csv = _csv_bytes(key or frame_fingerprint(df), df)
     st.download_button("Download filtered data (CSV)", csv, "filtered_shipments.csv", "text/csv")
 
 def data_dictionary_expander() -> None:
@@ -1,5 +1,5 @@
 # hf_model_access_check.py
-import os, sys, time
+import os, sys, time, hashlib, json
 import tomllib  # Py ≥3.11
 from huggingface_hub import HfApi, hf_hub_download, InferenceClient
 from huggingface_hub.utils import HfHubHTTPError
@@ -14,30 +14,65 @@ def get_token():
     except FileNotFoundError:
         return None
 
+CACHE_DIR = ".hf_check_cache"
+CACHE_TTL_S = 24 * 3600
+
+def _cache_dir(repo, token):
+    # keyed by (repo, token) so a new token re-checks access; only a hash of the token touches disk
+    tok_hash = hashlib.sha256(token.encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, repo.replace("/", "__"), tok_hash)
+
+def _fresh(path):
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < CACHE_TTL_S
+
+def _model_info(repo, token):
+    """(gated, disabled) from model_info, served from the on-disk cache when <24h old."""
+    path = os.path.join(_cache_dir(repo, token), "model_info.json")
+    if _fresh(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f), True
+    info = HfApi().model_info(repo_id=repo, token=token)
+    meta = {"gated": getattr(info, "gated", None), "disabled": getattr(info, "disabled", None)}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, default=str)
+    return meta, False
+
 def main():
     token = get_token()
     if not token:
         raise SystemExit("❌ HF_TOKEN not found (env or .streamlit/secrets.toml).")
 
     repo = sys.argv[1] if len(sys.argv) > 1 else "meta-llama/Llama-2-7b-chat-hf"
-    api = HfApi()
 
     # 1) Metadata (sanity)
     try:
-        info = api.model_info(repo_id=repo, token=token)
-        print(f"ℹ️ model_info: gated={getattr(info, 'gated', None)}, disabled={getattr(info, 'disabled', None)}")
+        meta, from_cache = _model_info(repo, token)
+        print(f"ℹ️ model_info{' (cached <24h)' if from_cache else ''}: gated={meta['gated']}, disabled={meta['disabled']}")
     except Exception as e:
         print(f"⚠️ model_info error: {e}")
 
-    # 2) File access (definitive license check)
-    try:
-        p = hf_hub_download(repo_id=repo, filename="config.json", token=token, local_dir=".hf_check", local_dir_use_symlinks=False)
-        print(f"✅ File access OK: downloaded {p}")
+    # 2) File access (definitive license check) — a config.json fetched <24h ago with this token counts
+    local_dir = _cache_dir(repo, token)
+    cached = os.path.join(local_dir, "config.json")
+    file_cached = _fresh(cached)
+    if file_cached:
+        print(f"✅ File access OK (cached <24h): {cached}")
         file_ok = True
-    except HfHubHTTPError as e:
-        code = getattr(e.response, "status_code", None)
-        print(f"❌ File access error ({code}): {e}")
-        file_ok = False
+    else:
+        try:
+            p = hf_hub_download(repo_id=repo, filename="config.json", token=token, local_dir=local_dir, local_dir_use_symlinks=False)
+            os.utime(p)  # the download may keep the remote mtime; freshness is measured from this check
+            print(f"✅ File access OK: downloaded {p}")
+            file_ok = True
+        except HfHubHTTPError as e:
+            code = getattr(e.response, "status_code", None)
+            print(f"❌ File access error ({code}): {e}")
+            file_ok = False
+
+    if file_cached:
+        print("🎉 Access CONFIRMED for:", repo)
+        return
 
     # 3) Inference (serverless) — optional but nice to confirm
     try:
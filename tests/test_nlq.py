@@ -0,0 +1,40 @@
+import unittest
+
+import pandas as pd
+
+from nlq import apply_prompt_filters
+
+
+def _frame() -> pd.DataFrame:
+    po_date = pd.date_range("2024-01-01", periods=12, freq="MS")
+    return pd.DataFrame({
+        "po_date": po_date,
+        "status": ["Delayed", "Delivered"] * 6,
+        "mode": ["Air", "Ocean", "Road"] * 4,
+        "origin_country": ["CN"] * 12,
+        "supplier": ["Alpha Components"] * 12,
+        "lane": ["CN->IN"] * 12,
+        "total_landed_cost": [1.0] * 12,
+    })
+
+
+class DatePhraseTest(unittest.TestCase):
+    def test_last_n_accepts_any_whitespace(self):
+        df = _frame()
+        expected, note = apply_prompt_filters(df, df, "last 3 months delayed")
+        self.assertIn("date range", note)
+        for prompt in ("last\n3 months delayed", "last\t3 months delayed"):
+            with self.subTest(prompt=prompt):
+                out, note = apply_prompt_filters(df, df, prompt)
+                self.assertIn("date range", note)
+                pd.testing.assert_frame_equal(out, expected)
+
+    def test_no_date_phrase_keeps_all_dates(self):
+        df = _frame()
+        out, note = apply_prompt_filters(df, df, "delayed shipments")
+        self.assertNotIn("date range", note)
+        self.assertEqual(len(out), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+import pandas as pd
+
+from planner import apply_llm_plan
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "supplier": pd.Categorical(["A", "A", "A", "B", "B", "C"]),
+        "mode": pd.Categorical(["Air", "Road", "Air", "Air", "Ocean", "Road"]),
+        "incoterm": ["FOB", "FOB", "DAP", "FOB", "DAP", "FOB"],
+        "total_landed_cost": [1.0, 1.0, 1.0, 50.0, 60.0, 5.0],
+    })
+
+
+class LimitPlanTest(unittest.TestCase):
+    def test_numeric_metric_ranks_by_sum(self):
+        df = _frame()
+        out = apply_llm_plan(df, df, {"limit": {"dimension": "supplier", "n": 1, "metric": "spend"}})
+        self.assertEqual(set(out["supplier"]), {"B"})
+
+    def test_non_numeric_metric_falls_back_to_counts(self):
+        df = _frame()
+        for metric in ("incoterm", "mode"):  # plain strings and a categorical
+            with self.subTest(metric=metric):
+                out = apply_llm_plan(df, df, {"limit": {"dimension": "supplier", "n": 1, "metric": metric}})
+                self.assertEqual(set(out["supplier"]), {"A"})
+
+
+if __name__ == "__main__":
+    unittest.main()
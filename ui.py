@@ -1,7 +1,9 @@
 from __future__ import annotations
 import streamlit as st
 import pandas as pd
-from typing import Callable, Optional
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
 
 def header(app_title: str) -> None:
     st.set_page_config(page_title="Procurement & Shipment Insights", layout="wide")
@@ -16,12 +18,14 @@ def data_source_picker(
 ) -> pd.DataFrame:
     st.sidebar.header("Data")
     use_sample = st.sidebar.checkbox("Use sample data", value=True)
-    uploaded = st.sidebar.file_uploader("Upload shipment CSV", type=["csv"])
+    uploaded = st.sidebar.file_uploader("Upload shipment CSV", type=["csv", "parquet", "feather"])
 
     if use_sample:
         df = load_sample()
+        source_key = "sample"
     elif uploaded:
         df = load_uploaded(uploaded)
+        source_key = f"upload:{getattr(uploaded, 'file_id', None) or (uploaded.name, uploaded.size)}"
     else:
         st.info("Upload a file or check 'Use sample data' to get started.")
         st.stop()
@@ -31,7 +35,22 @@ def data_source_picker(
         st.error(err)
         st.stop()
 
-    return derive_features(df)
+    out = derive_features(df)
+    # Identifies the dataset across reruns (cached frames come back as new objects each run)
+    out.attrs["source_key"] = source_key
+    return out
+
+def reuse_across_reruns(slot: str, key: Optional[Hashable], compute: Callable[[], T]) -> T:
+    """
+    Return the value stored in session_state[slot] if it was computed for the same `key`,
+    otherwise compute and store it. A `key` of None always recomputes.
+    """
+    prev: Any = st.session_state.get(slot)
+    if key is not None and prev is not None and prev[0] == key:
+        return prev[1]
+    value = compute()
+    st.session_state[slot] = (key, value)
+    return value
 
 def footer_description() -> None:
     with st.expander("ℹ️ Note: About this app and expected data format", expanded=False):